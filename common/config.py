@@ -9,6 +9,9 @@ from common.Logger import logger
 # 只在环境变量不存在时才从.env加载值
 load_dotenv(override=False)
 
+# 代理选择使用独立的RNG实例，避免多线程下争用random模块的全局状态
+_proxy_rng = random.SystemRandom()
+
 
 class Config:
     GITHUB_TOKENS_STR = os.getenv("GITHUB_TOKENS", "")
@@ -50,6 +53,13 @@ class Config:
     # 日期范围过滤器配置 (单位：天)
     DATE_RANGE_DAYS = int(os.getenv("DATE_RANGE_DAYS", "730"))  # 默认730天 (约2年)
 
+    # item处理线程池大小 (process_item基本都在等网络IO，可适当调大)
+    ITEM_WORKERS = int(os.getenv("ITEM_WORKERS", "8"))
+
+    # 单文件提取上限：真实泄漏几乎都在小配置文件里，超大文件和海量"key"基本是垃圾数据
+    MAX_FILE_SIZE_BYTES = int(os.getenv("MAX_FILE_SIZE_BYTES", str(1024 * 1024)))  # 默认1MB
+    MAX_KEYS_PER_FILE = int(os.getenv("MAX_KEYS_PER_FILE", "64"))
+
     # 查询文件路径配置
     QUERIES_FILE = os.getenv("QUERIES_FILE", "queries.txt")
 
@@ -83,7 +93,7 @@ class Config:
         if not cls.PROXY_LIST:
             return None
         
-        proxy_url = random.choice(cls.PROXY_LIST).strip()
+        proxy_url = _proxy_rng.choice(cls.PROXY_LIST).strip()
         
         # 返回requests格式的proxies字典
         return {
@@ -0,0 +1,75 @@
+import hashlib
+import pickle
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+
+class BloomFilter:
+    """简易布隆过滤器：约10 bits/元素，双重哈希生成k个bit位
+
+    只支持add和成员判断，存在极低概率的误判（判定存在但实际不存在），
+    不会漏判。用于以极小内存记录海量已见过的sha
+    """
+
+    def __init__(self, capacity: int = 1_000_000, num_hashes: int = 7):
+        self.num_bits = capacity * 10
+        self.num_hashes = num_hashes
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _indexes(self, item: str):
+        digest = hashlib.sha1(item.encode('utf-8')).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> None:
+        for idx in self._indexes(item):
+            self.bits[idx >> 3] |= 1 << (idx & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[idx >> 3] & (1 << (idx & 7)) for idx in self._indexes(item))
+
+
+class ScannedShaSet:
+    """scanned_shas的混合存储：最近的sha保留在精确集合中（负责持久化为文本），
+    超出上限的老sha只留在布隆过滤器里。
+
+    长时间运行时内存从每sha约90字节降到约10 bit；误判仅导致个别文件被跳过，
+    相比重复抓取文件内容的开销可以接受
+    """
+
+    def __init__(self, recent_limit: int = 100_000):
+        self.recent_limit = recent_limit
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._bloom = BloomFilter()
+
+    def add(self, sha: str) -> None:
+        if not sha:
+            return
+        self._bloom.add(sha)
+        self._recent[sha] = None
+        self._recent.move_to_end(sha)
+        # 被挤出精确集合的sha仍保留在布隆过滤器中
+        while len(self._recent) > self.recent_limit:
+            self._recent.popitem(last=False)
+
+    def __contains__(self, sha: str) -> bool:
+        return sha in self._recent or sha in self._bloom
+
+    def __iter__(self) -> Iterator[str]:
+        """仅迭代精确集合，供持久化写回文本文件"""
+        return iter(self._recent)
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def dump_bloom(self, path: str) -> None:
+        with open(path, 'wb') as f:
+            pickle.dump(self._bloom, f)
+
+    def load_bloom(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            bloom = pickle.load(f)
+        if isinstance(bloom, BloomFilter):
+            self._bloom = bloom
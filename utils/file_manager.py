@@ -1,18 +1,27 @@
 import json
 import os
+import threading
+import time
 import traceback
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, Iterable, List, Optional, Any, Set
 
 from common.Logger import logger
 from common.config import Config
+from utils.bloom_filter import ScannedShaSet
+
+# 可选依赖orjson：checkpoint里的列表随运行增长，C实现的编码器比标准库快数倍
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 @dataclass
 class Checkpoint:
     last_scan_time: Optional[str] = None
-    scanned_shas: Set[str] = field(default_factory=set)
+    scanned_shas: ScannedShaSet = field(default_factory=ScannedShaSet)
     processed_queries: Set[str] = field(default_factory=set)
     wait_send_balancer: Set[str] = field(default_factory=set)
     wait_send_gpt_load: Set[str] = field(default_factory=set)
@@ -31,7 +40,7 @@ class Checkpoint:
         """从字典创建Checkpoint对象，scanned_shas需要单独加载"""
         return cls(
             last_scan_time=data.get("last_scan_time"),
-            scanned_shas=set(),  # 将通过FileManager单独加载
+            scanned_shas=ScannedShaSet(),  # 将通过FileManager单独加载
             processed_queries=set(data.get("processed_queries", [])),
             wait_send_balancer=set(data.get("wait_send_balancer", [])),
             wait_send_gpt_load=set(data.get("wait_send_gpt_load", []))
@@ -63,6 +72,15 @@ class FileManager:
         self.checkpoint_file = os.path.join(data_dir, "checkpoint.json")
         self.scanned_shas_file = os.path.join(data_dir, Config.SCANNED_SHAS_FILE)
 
+        # checkpoint保存节流：随着scanned_shas增长，全量落盘越来越贵，高频调用点按时间合并
+        self.checkpoint_save_interval = 30
+        self._last_checkpoint_save = 0.0
+
+        # 全局checkpoint锁：主循环worker、SyncUtils的入队/批次/落盘线程
+        # 共用这一把，改checkpoint和写盘互斥，避免落盘时遍历到一半集合被改。
+        # 用RLock是因为持锁方（如批次worker更新完队列后）会直接再调save_checkpoint
+        self.checkpoint_lock = threading.RLock()
+
         # 2. 动态文件名
         self._detail_log_filename: Optional[str] = None
         self._keys_valid_filename: Optional[str] = None
@@ -171,9 +189,10 @@ class FileManager:
 
         if os.path.exists(self.checkpoint_file):
             try:
-                with open(self.checkpoint_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    checkpoint = Checkpoint.from_dict(data)
+                with open(self.checkpoint_file, "rb") as f:
+                    raw = f.read()
+                data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+                checkpoint = Checkpoint.from_dict(data)
             except Exception as e:
                 logger.warning(f"Cannot read {self.checkpoint_file}: {e}. Will create new checkpoint.")
         else:
@@ -185,9 +204,17 @@ class FileManager:
 
         return checkpoint
 
-    def load_scanned_shas(self) -> Set[str]:
-        """从文件中加载已扫描的SHA列表"""
-        scanned_shas = set()
+    def load_scanned_shas(self) -> ScannedShaSet:
+        """从文件中加载已扫描的SHA列表（精确集合 + 布隆过滤器）"""
+        scanned_shas = ScannedShaSet()
+
+        # 历史布隆过滤器记录了被精确集合淘汰的老sha
+        bloom_file = self.scanned_shas_file + ".bloom"
+        if os.path.isfile(bloom_file):
+            try:
+                scanned_shas.load_bloom(bloom_file)
+            except Exception as e:
+                logger.warning(f"Cannot read {bloom_file}: {e}. Starting with empty bloom filter.")
 
         if os.path.isfile(self.scanned_shas_file):
             try:
@@ -229,21 +256,34 @@ class FileManager:
     # 保存方法
     # ================================
 
+    def save_checkpoint_if_due(self, checkpoint: Checkpoint) -> None:
+        """节流版checkpoint保存：距上次落盘不足间隔时直接跳过"""
+        with self.checkpoint_lock:
+            if time.monotonic() - self._last_checkpoint_save < self.checkpoint_save_interval:
+                return
+            self.save_checkpoint(checkpoint)
+
     def save_checkpoint(self, checkpoint: Checkpoint) -> None:
-        """保存checkpoint数据"""
-        # 1. 保存scanned_shas到单独文件
-        self.save_scanned_shas(checkpoint.scanned_shas)
-        # 2. 保存其他数据到checkpoint.json
-        try:
-            with open(self.checkpoint_file, "w", encoding="utf-8") as f:
-                json.dump(checkpoint.to_dict(), f, ensure_ascii=False, indent=2)
-            # 修改点：移除重复加载，避免不必要的IO
-            # checkpoint = self.load_checkpoint() 
-        except Exception as e:
-            logger.error(f"Failed to save {self.checkpoint_file}: {e}")
+        """保存checkpoint数据（全程持checkpoint_lock，落盘期间集合不被并发修改）"""
+        with self.checkpoint_lock:
+            self._last_checkpoint_save = time.monotonic()
+            # 1. 保存scanned_shas到单独文件
+            self.save_scanned_shas(checkpoint.scanned_shas)
+            # 2. 保存其他数据到checkpoint.json
+            try:
+                if orjson is not None:
+                    with open(self.checkpoint_file, "wb") as f:
+                        f.write(orjson.dumps(checkpoint.to_dict(), option=orjson.OPT_INDENT_2))
+                else:
+                    with open(self.checkpoint_file, "w", encoding="utf-8") as f:
+                        json.dump(checkpoint.to_dict(), f, ensure_ascii=False, indent=2)
+                # 修改点：移除重复加载，避免不必要的IO
+                # checkpoint = self.load_checkpoint()
+            except Exception as e:
+                logger.error(f"Failed to save {self.checkpoint_file}: {e}")
 
-    def save_scanned_shas(self, scanned_shas: Set[str]) -> None:
-        """保存已扫描的SHA列表到文件"""
+    def save_scanned_shas(self, scanned_shas: ScannedShaSet) -> None:
+        """保存已扫描的SHA列表到文件（文本只含精确集合，布隆过滤器另存）"""
         try:
             with open(self.scanned_shas_file, "w", encoding="utf-8") as f:
                 f.write("# 已扫描的文件SHA列表\n")
@@ -252,6 +292,7 @@ class FileManager:
                 f.write("\n")
                 for sha in sorted(scanned_shas):
                     f.write(f"{sha}\n")
+            scanned_shas.dump_bloom(self.scanned_shas_file + ".bloom")
         except Exception as e:
             logger.error(f"Failed to save scanned SHAs to {self.scanned_shas_file}: {e}")
 
@@ -294,7 +335,7 @@ class FileManager:
                 for key in rate_limited_keys:
                     f.write(f"{key}\n")
 
-    def save_keys_send_result(self, keys: List[str], send_result: dict) -> None:
+    def save_keys_send_result(self, keys: Iterable[str], send_result: dict) -> None:
         """保存发送到外部应用的结果"""
         if not keys:
             return
@@ -0,0 +1,45 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """线程安全的令牌桶限速器
+
+    并发worker共用一个桶：桶里有令牌就立即放行，耗尽时才真正睡眠等待补充，
+    用于取代各线程各自盲等的固定随机sleep
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: float = None):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """阻塞直到取得指定数量的令牌"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """立即扣减令牌（允许透支），返回调用方自行等待的秒数
+
+        给协程路径用：拿到等待时长后 await asyncio.sleep(wait)，
+        不在事件循环里做阻塞式sleep；透支保证并发reserve按先后排队
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
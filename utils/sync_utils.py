@@ -1,4 +1,6 @@
+import gzip
 import json
+import random
 import threading
 import time
 import traceback
@@ -6,11 +8,57 @@ from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# orjson为C实现，上千key的config解析/序列化比stdlib json快数倍，未安装则回退
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from common.Logger import logger
 from common.config import Config
 from utils.file_manager import file_manager, checkpoint
 
+# 开关在进程生命周期内不会变，import时求值一次成常量，
+# 两者都关时连executor/调度线程都不用创建
+_BALANCER_ENABLED = bool(
+    Config.GROK_BALANCER_URL and Config.GROK_BALANCER_AUTH
+    and Config.parse_bool(Config.GROK_BALANCER_SYNC_ENABLED)
+)
+_GPT_LOAD_ENABLED = bool(
+    Config.GPT_LOAD_URL and Config.GPT_LOAD_AUTH and Config.GPT_LOAD_GROUP_NAME
+    and Config.parse_bool(Config.GPT_LOAD_SYNC_ENABLED)
+)
+
+# 单次HTTP携带的key上限：远端宕机期间队列可能积压上万key，
+# 一次性全量发送容易撞服务端请求体上限(413)而反复失败
+_SEND_CHUNK_SIZE = 500
+
+
+class _SetEncoder(json.JSONEncoder):
+    """让json.dumps直接序列化set，省掉发送前专门物化一份list副本"""
+
+    def default(self, o):
+        if isinstance(o, (set, frozenset)):
+            return list(o)
+        return super().default(o)
+
+
+def _json_loads(response) -> dict:
+    """解析HTTP响应体，优先走orjson"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def _json_dumps(obj) -> bytes:
+    """序列化成bytes请求体，set由default/encoder原地转list"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=list)
+    return json.dumps(obj, cls=_SetEncoder).encode('utf-8')
+
 
 class SyncUtils:
     """同步工具类，负责异步发送keys到外部应用"""
@@ -20,30 +68,59 @@ class SyncUtils:
         # --- 修改点：将 GEMINI 改为 GROK ---
         self.balancer_url = Config.GROK_BALANCER_URL.rstrip('/') if Config.GROK_BALANCER_URL else ""
         self.balancer_auth = Config.GROK_BALANCER_AUTH
-        self.balancer_sync_enabled = Config.parse_bool(Config.GROK_BALANCER_SYNC_ENABLED)
-        self.balancer_enabled = bool(self.balancer_url and self.balancer_auth and self.balancer_sync_enabled)
+        self.balancer_enabled = _BALANCER_ENABLED
 
         # GPT Load Balancer 配置
         self.gpt_load_url = Config.GPT_LOAD_URL.rstrip('/') if Config.GPT_LOAD_URL else ""
         self.gpt_load_auth = Config.GPT_LOAD_AUTH
         # 解析多个group names (逗号分隔)
         self.gpt_load_group_names = [name.strip() for name in Config.GPT_LOAD_GROUP_NAME.split(',') if name.strip()] if Config.GPT_LOAD_GROUP_NAME else []
-        self.gpt_load_sync_enabled = Config.parse_bool(Config.GPT_LOAD_SYNC_ENABLED)
-        self.gpt_load_enabled = bool(self.gpt_load_url and self.gpt_load_auth and self.gpt_load_group_names and self.gpt_load_sync_enabled)
+        self.gpt_load_enabled = _GPT_LOAD_ENABLED
+
+        # 复用TCP+TLS连接：balancer同步每个周期要打多次HTTP，每次重新握手白白多付一个RTT
+        self.session = requests.Session()
+        # 瞬时故障（连接超时/5xx/429）在adapter层指数退避重试，不用把整批key再压回队列等60秒
+        # 注意PUT/POST也加入重试：balancer的config PUT和keys_text POST都是重复提交安全的
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(
+                total=3, connect=3, read=2, status=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET", "PUT", "POST"])
+            )
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
-        # 创建线程池用于异步执行
-        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="SyncUtils")
-        self.saving_checkpoint = False
+        # 保护checkpoint队列读写的锁（取代原先的bool标志+0.5秒轮询）。
+        # 与FileManager共用同一把RLock：主循环worker改scanned_shas/落盘时
+        # 也持有它，不会出现本线程落盘遍历到一半集合被另一把锁下的代码改掉
+        self._cp_lock = file_manager.checkpoint_lock
 
         # 周期性发送控制
         self.batch_interval = 60
-        self.batch_timer = None
-        self.shutdown_flag = False
+        self._shutdown_event = threading.Event()
+        self._sched_thread: Optional[threading.Thread] = None
+
+        # checkpoint落盘合并：生产者只置脏标记，专职线程按节流间隔真正写盘
+        self._cp_dirty = threading.Event()
+        self.min_persist_interval = 2
+        self._persist_thread: Optional[threading.Thread] = None
+
+        # balancer远端已有key的本地快照：覆盖本批key时整个GET/PUT往返都可以省掉
+        self._balancer_known_keys: Optional[set] = None
 
-        # GPT Load Balancer group ID 缓存 (15分钟缓存)
-        self.group_id_cache: Dict[str, int] = {}
-        self.group_id_cache_time: Dict[str, float] = {}
+        # 本进程内已成功送达各目的地的key：生产者反复提交同一批key时入队前直接过滤
+        self._sent_balancer: set = set()
+        self._sent_gpt_load: set = set()
+
+        # GPT Load Balancer group ID 缓存 (15分钟缓存)：name -> (id, 过期时刻)
+        # 过期时刻基于monotonic并加随机抖动，避免多个group同秒集体过期引发解析风暴
+        self.group_id_cache: Dict[str, tuple] = {}
         self.group_id_cache_ttl = 15 * 60  # 15分钟
+        self._group_cache_lock = threading.Lock()
 
         if not self.balancer_enabled:
             logger.warning("🚫 Grok Balancer sync disabled - URL or AUTH not configured")
@@ -55,6 +132,10 @@ class SyncUtils:
         else:
             logger.info(f"🔗 GPT Load Balancer enabled - URL: {self.gpt_load_url}, Groups: {', '.join(self.gpt_load_group_names)}")
 
+        # 后台预热group ID缓存，首个批次不再付出冷启动的解析RTT
+        if self.gpt_load_enabled:
+            threading.Thread(target=self._prewarm_group_ids, name="SyncUtilsPrewarm", daemon=True).start()
+
         # 启动周期性发送线程
         self._start_batch_sender()
 
@@ -65,40 +146,46 @@ class SyncUtils:
         if not keys:
             return
 
-        # Acquire lock for checkpoint saving
-        while self.saving_checkpoint:
-            logger.info(f"📥 Checkpoint is currently being saved, waiting before adding {len(keys)} key(s) to queues...")
-            time.sleep(0.5)
+        keys_set = set(keys)
 
-        self.saving_checkpoint = True
-        try:
+        with self._cp_lock:
             # Grok Balancer (原 Gemini Balancer)
+            # 先差集算出真正的新key再并入，省掉更新前后各数一遍len的写法
             if self.balancer_enabled:
-                initial_balancer_count = len(checkpoint.wait_send_balancer)
-                checkpoint.wait_send_balancer.update(keys)
-                new_balancer_count = len(checkpoint.wait_send_balancer)
-                added_balancer_count = new_balancer_count - initial_balancer_count
-                logger.info(f"📥 Added {added_balancer_count} key(s) to grok balancer queue (total: {new_balancer_count})")
+                new_balancer_keys = keys_set - self._sent_balancer
+                added_balancer_count = len(new_balancer_keys - checkpoint.wait_send_balancer)
+                checkpoint.wait_send_balancer |= new_balancer_keys
+                if added_balancer_count:
+                    self._cp_dirty.set()
+                logger.info(f"📥 Added {added_balancer_count} key(s) to grok balancer queue (total: {len(checkpoint.wait_send_balancer)})")
             else:
                 logger.info(f"🚫 Grok Balancer disabled, skipping {len(keys)} key(s) for grok balancer queue")
 
             # GPT Load Balancer
             if self.gpt_load_enabled:
-                initial_gpt_count = len(checkpoint.wait_send_gpt_load)
-                checkpoint.wait_send_gpt_load.update(keys)
-                new_gpt_count = len(checkpoint.wait_send_gpt_load)
-                added_gpt_count = new_gpt_count - initial_gpt_count
-                logger.info(f"📥 Added {added_gpt_count} key(s) to GPT load balancer queue (total: {new_gpt_count})")
+                new_gpt_keys = keys_set - self._sent_gpt_load
+                added_gpt_count = len(new_gpt_keys - checkpoint.wait_send_gpt_load)
+                checkpoint.wait_send_gpt_load |= new_gpt_keys
+                if added_gpt_count:
+                    self._cp_dirty.set()
+                logger.info(f"📥 Added {added_gpt_count} key(s) to GPT load balancer queue (total: {len(checkpoint.wait_send_gpt_load)})")
             else:
                 logger.info(f"🚫 GPT Load Balancer disabled, skipping {len(keys)} key(s) for GPT load balancer queue")
 
-            file_manager.save_checkpoint(checkpoint)
-        finally:
-            self.saving_checkpoint = False
-
     def _send_balancer_worker(self, keys: List[str]) -> str:
         """实际执行发送到balancer的工作函数"""
         try:
+            # 本进程已成功送达过的key不再发起GET往返（入队时也过滤，这里兜底
+            # 覆盖"入队早于上一批发送成功"的竞态窗口）
+            if self._sent_balancer.issuperset(keys):
+                logger.info(f"ℹ️ All {len(keys)} key(s) already sent to grok balancer this session")
+                return "ok"
+
+            # 快照命中：远端已确认持有这批key，直接短路，不发任何请求
+            if self._balancer_known_keys is not None and self._balancer_known_keys.issuperset(keys):
+                logger.info(f"ℹ️ All {len(keys)} key(s) already present in grok balancer (cached)")
+                return "ok"
+
             logger.info(f"🔄 Sending {len(keys)} key(s) to grok balancer...")
 
             config_url = f"{self.balancer_url}/api/config"
@@ -107,35 +194,40 @@ class SyncUtils:
                 'User-Agent': 'HajimiKing/1.0'
             }
 
-            response = requests.get(config_url, headers=headers, timeout=30)
+            response = self.session.get(config_url, headers=headers, timeout=30)
             if response.status_code != 200:
                 logger.error(f"Failed to get config: HTTP {response.status_code} - {response.text}")
                 return "get_config_failed_not_200"
 
-            config_data = response.json()
+            config_data = _json_loads(response)
             current_api_keys = config_data.get('API_KEYS', [])
 
             existing_keys_set = set(current_api_keys)
-            new_add_keys_set = set()
-            for key in keys:
-                if key not in existing_keys_set:
-                    existing_keys_set.add(key)
-                    new_add_keys_set.add(key)
+            # GET成功即可刷新快照：这些key是远端确认存在的
+            self._balancer_known_keys = set(existing_keys_set)
+            # C层集合差集代替逐key的Python循环
+            new_add_keys_set = set(keys) - existing_keys_set
+            existing_keys_set |= new_add_keys_set
 
             if len(new_add_keys_set) == 0:
                 logger.info(f"ℹ️ All {len(keys)} key(s) already exist in grok balancer")
                 return "ok"
 
-            config_data['API_KEYS'] = list(existing_keys_set)
+            # set直接进编码器，不再先list(existing_keys_set)复制一遍
+            config_data['API_KEYS'] = existing_keys_set
             logger.info(f"📝 Updating grok balancer config with {len(new_add_keys_set)} new key(s)...")
 
             update_headers = headers.copy()
             update_headers['Content-Type'] = 'application/json'
+            # config体随API_KEYS数量线性膨胀，而key数组极易压缩（5-10x），
+            # 花几毫秒CPU换上行流量一个数量级的下降
+            update_headers['Content-Encoding'] = 'gzip'
+            body = gzip.compress(_json_dumps(config_data))
 
-            update_response = requests.put(
+            update_response = self.session.put(
                 config_url,
                 headers=update_headers,
-                json=config_data,
+                data=body,
                 timeout=60
             )
 
@@ -144,80 +236,106 @@ class SyncUtils:
                 return "update_config_failed_not_200"
 
             # 验证添加结果
-            updated_config = update_response.json()
+            updated_config = _json_loads(update_response)
             updated_api_keys = updated_config.get('API_KEYS', [])
             updated_keys_set = set(updated_api_keys)
-            failed_to_add = [key for key in new_add_keys_set if key not in updated_keys_set]
+            failed_to_add = new_add_keys_set - updated_keys_set
 
             if failed_to_add:
                 logger.error(f"❌ Failed to add {len(failed_to_add)} key(s)")
                 send_result = {key: ("update_failed" if key in failed_to_add else "ok") for key in new_add_keys_set}
-                file_manager.save_keys_send_result(list(new_add_keys_set), send_result)
+                file_manager.save_keys_send_result(new_add_keys_set, send_result)
                 return "update_failed"
 
             logger.info(f"✅ All {len(new_add_keys_set)} new key(s) successfully added to grok balancer.")
+            self._balancer_known_keys = updated_keys_set
             send_result = {key: "ok" for key in new_add_keys_set}
-            file_manager.save_keys_send_result(list(new_add_keys_set), send_result)
+            file_manager.save_keys_send_result(new_add_keys_set, send_result)
             return "ok"
 
         except Exception as e:
             logger.error(f"❌ Failed to send keys to grok balancer: {str(e)}")
             return "exception"
 
-    def _get_gpt_load_group_id(self, group_name: str) -> Optional[int]:
-        """获取GPT Load Balancer group ID，带缓存功能"""
-        current_time = time.time()
-        if (group_name in self.group_id_cache and
-            group_name in self.group_id_cache_time and
-            current_time - self.group_id_cache_time[group_name] < self.group_id_cache_ttl):
-            return self.group_id_cache[group_name]
-        
+    def _prewarm_group_ids(self) -> None:
+        """一次/api/groups拉取即可填满所有group的ID缓存"""
+        if self._refresh_group_index():
+            logger.info(f"🔥 Prewarmed group ID cache for {len(self.gpt_load_group_names)} group(s)")
+        else:
+            logger.warning("⚠️ Group ID prewarm failed")
+
+    def _refresh_group_index(self) -> bool:
+        """拉取/api/groups并把响应里全部name->id写入缓存（一次响应本来就包含所有group）"""
         try:
             groups_url = f"{self.gpt_load_url}/api/groups"
             headers = {'Authorization': f'Bearer {self.gpt_load_auth}', 'User-Agent': 'HajimiKing/1.0'}
-            response = requests.get(groups_url, headers=headers, timeout=30)
-            if response.status_code != 200: return None
+            response = self.session.get(groups_url, headers=headers, timeout=30)
+            if response.status_code != 200: return False
 
-            groups_data = response.json()
-            if groups_data.get('code') != 0: return None
+            groups_data = _json_loads(response)
+            if groups_data.get('code') != 0: return False
 
-            groups_list = groups_data.get('data', [])
-            for group in groups_list:
-                if group.get('name') == group_name:
+            now = time.monotonic()
+            with self._group_cache_lock:
+                for group in groups_data.get('data', []):
+                    name = group.get('name')
                     group_id = group.get('id')
-                    self.group_id_cache[group_name] = group_id
-                    self.group_id_cache_time[group_name] = current_time
-                    return group_id
-            return None
+                    if name is None or group_id is None:
+                        continue
+                    self.group_id_cache[name] = (group_id, now + self.group_id_cache_ttl + random.uniform(0, 30))
+            return True
         except Exception:
+            return False
+
+    def _get_gpt_load_group_id(self, group_name: str) -> Optional[int]:
+        """获取GPT Load Balancer group ID，带缓存功能"""
+        cached = self.group_id_cache.get(group_name)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        if not self._refresh_group_index():
             return None
+        cached = self.group_id_cache.get(group_name)
+        return cached[0] if cached else None
 
     def _send_gpt_load_worker(self, keys: List[str]) -> str:
         """发送到GPT load balancer的工作函数"""
         try:
-            all_success = True
             failed_groups = []
+
+            # 先解析全部group id，再并发向各group发送，N个串行RTT重叠成约1个
+            group_ids: Dict[str, int] = {}
             for group_name in self.gpt_load_group_names:
                 group_id = self._get_gpt_load_group_id(group_name)
                 if group_id is None:
                     failed_groups.append(group_name)
-                    all_success = False
-                    continue
-
-                add_keys_url = f"{self.gpt_load_url}/api/keys/add-async"
-                payload = {"group_id": group_id, "keys_text": ",".join(keys)}
-                add_headers = {
-                    'Authorization': f'Bearer {self.gpt_load_auth}',
-                    'Content-Type': 'application/json',
-                    'User-Agent': 'HajimiKing/1.0'
-                }
-                add_response = requests.post(add_keys_url, headers=add_headers, json=payload, timeout=60)
-
-                if add_response.status_code != 200 or add_response.json().get('code') != 0:
-                    failed_groups.append(group_name)
-                    all_success = False
+                else:
+                    group_ids[group_name] = group_id
+
+            add_keys_url = f"{self.gpt_load_url}/api/keys/add-async"
+            keys_text = ",".join(keys)
+            add_headers = {
+                'Authorization': f'Bearer {self.gpt_load_auth}',
+                'Content-Type': 'application/json',
+                'User-Agent': 'HajimiKing/1.0'
+            }
 
-            if all_success:
+            def _post_group(group_id: int) -> bool:
+                try:
+                    payload = {"group_id": group_id, "keys_text": keys_text}
+                    add_response = self.session.post(add_keys_url, headers=add_headers, data=_json_dumps(payload), timeout=60)
+                    return add_response.status_code == 200 and _json_loads(add_response).get('code') == 0
+                except Exception:
+                    return False
+
+            if group_ids:
+                with ThreadPoolExecutor(max_workers=min(8, len(group_ids))) as pool:
+                    results = list(pool.map(_post_group, group_ids.values()))
+                for group_name, success in zip(group_ids, results):
+                    if not success:
+                        failed_groups.append(group_name)
+
+            if not failed_groups:
                 send_result = {key: "ok" for key in keys}
                 file_manager.save_keys_send_result(keys, send_result)
                 return "ok"
@@ -229,43 +347,86 @@ class SyncUtils:
             return "exception"
 
     def _start_batch_sender(self) -> None:
-        if self.shutdown_flag: return
-        self.executor.submit(self._batch_send_worker)
-        self.batch_timer = threading.Timer(self.batch_interval, self._start_batch_sender)
-        self.batch_timer.daemon = True
-        self.batch_timer.start()
+        if not (_BALANCER_ENABLED or _GPT_LOAD_ENABLED):
+            return
+        self._sched_thread = threading.Thread(target=self._scheduler_loop, name="SyncUtilsScheduler", daemon=True)
+        self._sched_thread.start()
+        self._persist_thread = threading.Thread(target=self._persist_loop, name="SyncUtilsPersister", daemon=True)
+        self._persist_thread.start()
+
+    def _persist_loop(self) -> None:
+        """专职checkpoint落盘线程：把生产者高频置脏合并成低频写盘"""
+        while not self._shutdown_event.is_set():
+            if not self._cp_dirty.wait(timeout=1.0):
+                continue
+            self._cp_dirty.clear()
+            with self._cp_lock:
+                file_manager.save_checkpoint(checkpoint)
+            # 节流窗口内新置的脏标记只会触发下一轮写盘
+            time.sleep(self.min_persist_interval)
+
+    def _scheduler_loop(self) -> None:
+        """常驻调度线程：取代原先每60秒新建一个Timer线程的链条
+
+        批次任务就在本线程内同步执行——每60秒最多一个批次，
+        中转一层线程池纯属futures簿记开销
+        """
+        while True:
+            self._batch_send_worker()
+            # wait返回True说明shutdown被触发，立即退出而不是睡满整个间隔
+            if self._shutdown_event.wait(self.batch_interval):
+                break
+
+    @staticmethod
+    def _send_chunked(keys: List[str], worker) -> set:
+        """把key列表按_SEND_CHUNK_SIZE切片逐块发送，返回成功送达的key集合"""
+        sent: set = set()
+        for i in range(0, len(keys), _SEND_CHUNK_SIZE):
+            chunk = keys[i:i + _SEND_CHUNK_SIZE]
+            if worker(chunk) == 'ok':
+                sent.update(chunk)
+        return sent
 
     def _batch_send_worker(self) -> None:
-        while self.saving_checkpoint:
-            time.sleep(0.5)
-
-        self.saving_checkpoint = True
         try:
+            # 快照在锁内、HTTP在锁外：发送最长可阻塞60秒，不能让生产者等整个窗口
+            with self._cp_lock:
+                balancer_keys = list(checkpoint.wait_send_balancer) if self.balancer_enabled else []
+                gpt_load_keys = list(checkpoint.wait_send_gpt_load) if self.gpt_load_enabled else []
+
+            # 按固定大小切片发送：积压再多也不会撑爆单个请求体，
+            # 失败的切片留在队列里重试，成功的切片立即可出队
             # 修改点：同步名称改为 grok balancer 相关日志
-            if checkpoint.wait_send_balancer and self.balancer_enabled:
-                balancer_keys = list(checkpoint.wait_send_balancer)
-                result_code = self._send_balancer_worker(balancer_keys)
-                if result_code == 'ok':
-                    checkpoint.wait_send_balancer.clear()
-                    logger.info(f"✅ Grok balancer queue processed successfully")
-
-            if checkpoint.wait_send_gpt_load and self.gpt_load_enabled:
-                gpt_load_keys = list(checkpoint.wait_send_gpt_load)
-                result_code = self._send_gpt_load_worker(gpt_load_keys)
-                if result_code == 'ok':
-                    checkpoint.wait_send_gpt_load.clear()
-                    logger.info(f"✅ GPT load balancer queue processed successfully")
-
-            file_manager.save_checkpoint(checkpoint)
+            balancer_sent = self._send_chunked(balancer_keys, self._send_balancer_worker)
+            if balancer_keys and len(balancer_sent) == len(balancer_keys):
+                logger.info(f"✅ Grok balancer queue processed successfully")
+
+            gpt_load_sent = self._send_chunked(gpt_load_keys, self._send_gpt_load_worker)
+            if gpt_load_keys and len(gpt_load_sent) == len(gpt_load_keys):
+                logger.info(f"✅ GPT load balancer queue processed successfully")
+
+            # 重新拿锁，只移除本次实际发送成功的key（发送期间新入队的保留到下一批）
+            with self._cp_lock:
+                if balancer_sent:
+                    checkpoint.wait_send_balancer.difference_update(balancer_sent)
+                    self._sent_balancer.update(balancer_sent)
+                if gpt_load_sent:
+                    checkpoint.wait_send_gpt_load.difference_update(gpt_load_sent)
+                    self._sent_gpt_load.update(gpt_load_sent)
+                if balancer_sent or gpt_load_sent:
+                    file_manager.save_checkpoint(checkpoint)
         except Exception as e:
             logger.error(f"❌ Batch send worker error: {e}")
-        finally:
-            self.saving_checkpoint = False
 
     def shutdown(self) -> None:
-        self.shutdown_flag = True
-        if self.batch_timer: self.batch_timer.cancel()
-        self.executor.shutdown(wait=True)
+        self._shutdown_event.set()
+        if self._sched_thread: self._sched_thread.join(timeout=5)
+        if self._persist_thread: self._persist_thread.join(timeout=5)
+        # 收尾再刷一次，保证退出前最后置脏的队列不丢
+        if self._cp_dirty.is_set():
+            with self._cp_lock:
+                file_manager.save_checkpoint(checkpoint)
+        self.session.close()
         logger.info("🔚 SyncUtils shutdown complete")
 
 sync_utils = SyncUtils()